@@ -1,6 +1,8 @@
+import json
 import os
 import re
-from flask import Flask, jsonify
+import threading
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS  # Import CORS
 
 # --- Basic Setup ---
@@ -10,33 +12,63 @@ app = Flask(__name__, static_url_path="/static", static_folder="output/web")
 # This allows your React frontend (on a different port) to fetch data from this server.
 CORS(app)
 
+# --- Filename Pattern ---
+# Compiled once so the per-file loop doesn't go through re's pattern cache.
+_NDVI_RE = re.compile(r"NDVI_HLS\.S30\.(T\w+)\.(\d{7})T")
+
+# --- Listing Cache ---
+# The serialized file list is reused until the directory's mtime changes.
+_cache = {"mtime": None, "payload": None}
+_cache_lock = threading.Lock()
+
+
+def _build_file_info(geotiff_dir):
+    """Scan the GeoTIFF directory and build the path/label list."""
+    with os.scandir(geotiff_dir) as it:
+        parsed = [
+            (e.name, _NDVI_RE.search(e.name))
+            for e in it
+            if e.name.startswith("NDVI_") and e.name.endswith(".tif") and e.is_file()
+        ]
+
+    # Order by (date, tile) using the matches from the single regex pass;
+    # files that don't match the naming scheme fall back to their name
+    parsed.sort(
+        key=lambda item: (item[1].group(2), item[1].group(1)) if item[1] else (item[0],)
+    )
+
+    # Create a list of dictionaries with file paths and labels
+    file_info = []
+    for f, match in parsed:
+        label = f  # Default label is the filename
+        if match:
+            label = f"{match.group(1)} on {match.group(2)}"
+
+        file_info.append({"path": f"/static/ndvi_geotiffs/{f}", "label": label})
+
+    return file_info
+
 
 # --- API Endpoint ---
 @app.route("/api/geotiffs")
 def list_geotiffs():
-    """API endpoint to get a list of available NDVI files."""
+    """API endpoint to get a list of available NDVI files.
+
+    Pass ``?nocache=1`` to force a rescan of the directory.
+    """
     try:
         geotiff_dir = os.path.join("output", "web", "ndvi_geotiffs")
+        mtime = os.stat(geotiff_dir).st_mtime_ns
+        force = request.args.get("nocache") == "1"
+
+        with _cache_lock:
+            if force or mtime != _cache["mtime"]:
+                file_info = _build_file_info(geotiff_dir)
+                _cache["payload"] = json.dumps(file_info).encode("utf-8")
+                _cache["mtime"] = mtime
+            payload = _cache["payload"]
 
-        available_files = sorted(
-            [
-                f
-                for f in os.listdir(geotiff_dir)
-                if f.startswith("NDVI_") and f.endswith(".tif")
-            ]
-        )
-
-        # Create a list of dictionaries with file paths and labels
-        file_info = []
-        for f in available_files:
-            label = f  # Default label is the filename
-            match = re.search(r"NDVI_HLS\.S30\.(T\w+)\.(\d{7})T", f)
-            if match:
-                label = f"{match.group(1)} on {match.group(2)}"
-
-            file_info.append({"path": f"/static/ndvi_geotiffs/{f}", "label": label})
-
-        return jsonify(file_info)
+        return Response(payload, mimetype="application/json")
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
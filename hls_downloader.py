@@ -3,11 +3,37 @@ HLS Sentinel-2 Data Downloader for NASA Earthdata
 Downloads HLS S30 v2.0 data for specified region and date range
 """
 
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 import getpass
+import math
+import os
+import re
 from datetime import datetime, timedelta
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Stream downloads in 256 KiB chunks: fewer loop iterations and write calls
+CHUNK_SIZE = 256 * 1024
+
+# Back off only when the server asks us to (honours Retry-After)
+RETRY_POLICY = Retry(
+    total=5,
+    backoff_factor=0.5,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["GET"],
+    # Hand back the last response so callers' status checks still apply
+    raise_on_status=False,
+)
+
+# CMR search paging
+SEARCH_PAGE_SIZE = 500
+SEARCH_WORKERS = 4
+
+# CMR link relation for downloadable data files
+DATA_LINK_REL = 'http://esipfed.org/ns/fedsearch/1.1/data#'
 
 class HLSDownloader:
     def __init__(self, username=None, password=None):
@@ -33,6 +59,14 @@ class HLSDownloader:
         self.session = requests.Session()
         self.session.auth = (username, password)
         
+        # Larger connection pool so concurrent downloads reuse
+        # warm TCP/TLS connections instead of reconnecting
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32,
+                              max_retries=RETRY_POLICY)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Connection'] = 'keep-alive'
+        
     def search_granules(self, tile_id, start_date, end_date, bands=None):
         """
         Search for HLS granules
@@ -49,11 +83,19 @@ class HLSDownloader:
         if bands is None:
             bands = ['B04', 'B8A', 'Fmask']  # Red, NIR, Cloud mask
         
+        # Matches any requested band file, e.g. '.B04.tif'
+        band_pattern = re.compile(
+            r"\.(?:" + "|".join(map(re.escape, bands)) + r")\.tif(?:$|\?|#)"
+        )
+        
         params = {
             'short_name': 'HLSS30',
             'version': '2.0',
             'temporal': f"{start_date}T00:00:00Z,{end_date}T23:59:59Z",
-            'page_size': 2000,
+            # Filter by tile on the server so paging only covers our tile
+            'readable_granule_name': f"HLS.S30.{tile_id}.*",
+            'options[readable_granule_name][pattern]': 'true',
+            'page_size': SEARCH_PAGE_SIZE,
         }
         
         print(f"\nSearching for HLS data:")
@@ -61,7 +103,7 @@ class HLSDownloader:
         print(f"  Date range: {start_date} to {end_date}")
         print(f"  Bands: {', '.join(bands)}")
         
-        response = self.session.get(self.base_url, params=params)
+        response = self.session.get(self.base_url, params={**params, 'page_num': 1})
         
         if response.status_code != 200:
             print(f"Error searching: {response.status_code}")
@@ -69,8 +111,29 @@ class HLSDownloader:
         
         granules = response.json()['feed']['entry']
         
+        # Fetch any remaining pages concurrently, using the total from CMR-Hits
+        hits = int(response.headers.get('CMR-Hits', len(granules)))
+        num_pages = math.ceil(hits / SEARCH_PAGE_SIZE)
+        
+        if num_pages > 1:
+            def fetch_page(page_num):
+                page = self.session.get(self.base_url, params={**params, 'page_num': page_num})
+                page.raise_for_status()
+                return page.json()['feed']['entry']
+            
+            with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as executor:
+                try:
+                    # map() preserves page order
+                    for entries in executor.map(fetch_page, range(2, num_pages + 1)):
+                        granules.extend(entries)
+                except (requests.RequestException, ValueError, KeyError) as e:
+                    # ValueError/KeyError: malformed JSON page
+                    print(f"Error searching: {e}")
+                    return []
+        
         # Filter by tile and bands
-        filtered_urls = []
+        # dict keeps search order while dropping repeated URLs
+        filtered_urls = {}
         
         for granule in granules:
             granule_id = granule['title']
@@ -82,29 +145,75 @@ class HLSDownloader:
             # Get download links
             if 'links' in granule:
                 for link in granule['links']:
-                    if link['rel'] == 'http://esipfed.org/ns/fedsearch/1.1/data#':
+                    if link['rel'] == DATA_LINK_REL:
                         url = link['href']
                         
                         # Filter by requested bands
-                        for band in bands:
-                            if f".{band}.tif" in url:
-                                filtered_urls.append(url)
+                        if band_pattern.search(url):
+                            filtered_urls[url] = None
         
         print(f"\nFound {len(filtered_urls)} files to download")
-        return filtered_urls
+        return list(filtered_urls)
     
-    def download_file(self, url, output_dir):
-        """Download a single file"""
+    @staticmethod
+    def _prepare_sequential_write(f, total_size):
+        """Hint sequential access and preallocate the file (POSIX only)"""
+        try:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            if total_size and hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, total_size)
+        except OSError:
+            pass  # Only an optimisation; some filesystems don't support it
+    
+    @staticmethod
+    def _matches_expected_size(filepath, expected):
+        """
+        Whether a local file matches the server's Content-Length
+        
+        Downloads are written to a '.part' file and renamed when finished,
+        so this only has to catch files left by older or external runs.
+        """
+        local_size = filepath.stat().st_size
+        if expected < 0:
+            # Size unknown: only trust non-empty files
+            return local_size > 0
+        return local_size == expected
+    
+    def _is_complete(self, url, filepath):
+        """Check an existing file with a HEAD request instead of re-downloading"""
+        try:
+            head = self.session.head(url, allow_redirects=True)
+            # An error reply's Content-Length is that of its own body
+            expected = int(head.headers.get('content-length', -1)) if head.ok else -1
+        except (requests.RequestException, ValueError):
+            expected = -1
+        return self._matches_expected_size(filepath, expected)
+    
+    def download_file(self, url, output_dir, show_progress=True):
+        """
+        Download a single file
+        
+        Args:
+            url: File URL
+            output_dir: Output directory
+            show_progress: Print a per-chunk progress line (turn off when
+                several downloads run at once)
+        """
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
         filename = url.split('/')[-1]
         filepath = output_path / filename
+        partpath = filepath.with_suffix(filepath.suffix + '.part')
         
-        # Skip if already downloaded
+        # Skip if already downloaded; re-fetch partial or empty files
         if filepath.exists():
-            print(f"  ✓ Already exists: {filename}")
-            return True
+            if self._is_complete(url, filepath):
+                print(f"  ✓ Already exists: {filename}")
+                return True
+            # The old file is only replaced once the new download succeeds
+            print(f"  ↻ Incomplete, re-downloading: {filename}")
         
         try:
             print(f"  ⬇ Downloading: {filename}")
@@ -114,29 +223,39 @@ class HLSDownloader:
             
             total_size = int(response.headers.get('content-length', 0))
             
-            with open(filepath, 'wb') as f:
+            # Write under a temporary name so an interrupted (and possibly
+            # preallocated) download never appears as the final file
+            with open(partpath, 'wb') as f:
+                self._prepare_sequential_write(f, total_size)
                 downloaded = 0
-                for chunk in response.iter_content(chunk_size=8192):
+                downloaded_chunks = 0
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
                     if chunk:
                         f.write(chunk)
                         downloaded += len(chunk)
+                        downloaded_chunks += 1
                         
-                        # Progress indicator
-                        if total_size > 0:
+                        # Progress indicator (throttled so printing doesn't dominate)
+                        if show_progress and total_size > 0 and downloaded_chunks % 4 == 0:
                             percent = (downloaded / total_size) * 100
-                            print(f"    Progress: {percent:.1f}%", end='\r')
+                            print(f"    {filename}: {percent:.1f}%", end='\r')
+                
+                # Drop any preallocated space beyond what was received
+                f.truncate(downloaded)
             
+            os.replace(partpath, filepath)
             print(f"  ✓ Downloaded: {filename} ({total_size/1024/1024:.1f} MB)")
             return True
             
         except Exception as e:
             print(f"  ✗ Error downloading {filename}: {e}")
-            if filepath.exists():
-                filepath.unlink()  # Remove partial download
+            if partpath.exists():
+                partpath.unlink()  # Remove partial download
             return False
     
     def download_dataset(self, tile_id, start_date, end_date, 
-                        output_dir='hls_data', bands=None, max_files=None):
+                        output_dir='hls_data', bands=None, max_files=None,
+                        max_workers=6):
         """
         Download complete HLS dataset
         
@@ -147,6 +266,7 @@ class HLSDownloader:
             output_dir: Output directory
             bands: List of bands to download
             max_files: Maximum files to download (for testing)
+            max_workers: Number of files downloaded concurrently
         """
         print("="*70)
         print("HLS SENTINEL-2 DATA DOWNLOADER")
@@ -170,18 +290,37 @@ class HLSDownloader:
         success_count = 0
         fail_count = 0
         
-        for i, url in enumerate(urls, 1):
-            print(f"\n[{i}/{len(urls)}]")
-            
-            if self.download_file(url, output_dir):
-                success_count += 1
-            else:
-                fail_count += 1
+        # Per-chunk progress lines from parallel downloads would overwrite
+        # each other, so only show them when downloading one at a time
+        show_progress = max_workers == 1
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.download_file, url, output_dir, show_progress): url
+                for url in urls
+            }
             
-            # Rate limiting (be nice to NASA servers)
-            time.sleep(0.5)
+            for i, future in enumerate(as_completed(futures), 1):
+                filename = futures[future].split('/')[-1]
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    # Errors outside download_file's own handling count as failures
+                    print(f"  ✗ Error downloading {filename}: {e}")
+                    ok = False
+                
+                if ok:
+                    success_count += 1
+                    print(f"[{i}/{len(urls)}] {filename} ✓")
+                else:
+                    fail_count += 1
+                    print(f"[{i}/{len(urls)}] {filename} ✗")
         
-        # Summary
+        self._print_summary(success_count, fail_count, output_dir)
+    
+    @staticmethod
+    def _print_summary(success_count, fail_count, output_dir):
+        """Print the end-of-run download summary"""
         print("\n" + "="*70)
         print("DOWNLOAD COMPLETE")
         print("="*70)
@@ -190,6 +329,141 @@ class HLSDownloader:
             print(f"✗ Failed: {fail_count} files")
         print(f"📁 Location: {Path(output_dir).absolute()}")
         print("="*70)
+    
+    @staticmethod
+    def _retry_delay(retry_after, attempt):
+        """Seconds to wait before retry number attempt + 1 (see RETRY_POLICY)"""
+        try:
+            return max(0.0, float(retry_after))
+        except (TypeError, ValueError):
+            # Missing or HTTP-date Retry-After: use exponential backoff
+            return RETRY_POLICY.backoff_factor * (2 ** attempt)
+    
+    async def _download_file_async(self, session, url, output_dir, semaphore):
+        """Download a single file on the event loop (see download_file)"""
+        import aiofiles
+        import aiohttp
+        
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        
+        filename = url.split('/')[-1]
+        filepath = output_path / filename
+        partpath = filepath.with_suffix(filepath.suffix + '.part')
+        
+        async with semaphore:
+            # Skip if already downloaded; re-fetch partial or empty files
+            if filepath.exists():
+                try:
+                    async with session.head(url, allow_redirects=True) as head:
+                        # An error reply's Content-Length is that of its own body
+                        expected = (int(head.headers.get('Content-Length', -1))
+                                    if head.ok else -1)
+                except (aiohttp.ClientError, ValueError):
+                    expected = -1
+                if self._matches_expected_size(filepath, expected):
+                    print(f"  ✓ Already exists: {filename}")
+                    return True
+                # The old file is only replaced once the new download succeeds
+                print(f"  ↻ Incomplete, re-downloading: {filename}")
+            
+            try:
+                print(f"  ⬇ Downloading: {filename}")
+                
+                # Same backoff as the requests adapter's RETRY_POLICY
+                for attempt in range(RETRY_POLICY.total + 1):
+                    async with session.get(url) as response:
+                        if (response.status in RETRY_POLICY.status_forcelist
+                                and attempt < RETRY_POLICY.total):
+                            delay = self._retry_delay(
+                                response.headers.get('Retry-After'), attempt
+                            )
+                        else:
+                            response.raise_for_status()
+                            
+                            downloaded = 0
+                            # Only a finished download is renamed to the final name
+                            async with aiofiles.open(partpath, 'wb') as f:
+                                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                                    await f.write(chunk)
+                                    downloaded += len(chunk)
+                            break
+                    
+                    # Connection released above; wait before retrying
+                    print(f"  ↻ HTTP {response.status}, retrying {filename} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                
+                os.replace(partpath, filepath)
+                print(f"  ✓ Downloaded: {filename} ({downloaded/1024/1024:.1f} MB)")
+                return True
+                
+            except Exception as e:
+                print(f"  ✗ Error downloading {filename}: {e}")
+                if partpath.exists():
+                    partpath.unlink()  # Remove partial download
+                return False
+    
+    async def download_dataset_async(self, tile_id, start_date, end_date,
+                                     output_dir='hls_data', bands=None,
+                                     max_files=None, max_concurrent=8):
+        """
+        Download complete HLS dataset using aiohttp + aiofiles
+        
+        Same as download_dataset, but all downloads share one event loop
+        instead of a thread pool. Requires the optional aiohttp and
+        aiofiles packages.
+        
+        Args:
+            tile_id: MGRS tile ID
+            start_date: Start date 'YYYY-MM-DD'
+            end_date: End date 'YYYY-MM-DD'
+            output_dir: Output directory
+            bands: List of bands to download
+            max_files: Maximum files to download (for testing)
+            max_concurrent: Number of files downloaded concurrently
+        """
+        import aiohttp
+        
+        print("="*70)
+        print("HLS SENTINEL-2 DATA DOWNLOADER (async)")
+        print("="*70)
+        
+        # Search for granules (uses the requests session, off the event loop)
+        urls = await asyncio.to_thread(
+            self.search_granules, tile_id, start_date, end_date, bands
+        )
+        
+        if not urls:
+            print("No granules found!")
+            return
+        
+        if max_files:
+            urls = urls[:max_files]
+            print(f"\nLimiting to first {max_files} files for testing")
+        
+        # Download files
+        print(f"\nDownloading to: {output_dir}/")
+        print("="*70)
+        
+        username, password = self.session.auth
+        semaphore = asyncio.Semaphore(max_concurrent)
+        
+        # No overall cap (aiohttp's default is 300 s per request), which large
+        # GeoTIFFs on a shared link can exceed; only stalls are timed out
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+        
+        async with aiohttp.ClientSession(
+            auth=aiohttp.BasicAuth(username, password),
+            connector=aiohttp.TCPConnector(limit=16),
+            timeout=timeout,
+        ) as session:
+            results = await asyncio.gather(*[
+                self._download_file_async(session, url, output_dir, semaphore)
+                for url in urls
+            ])
+        
+        success_count = sum(results)
+        self._print_summary(success_count, len(results) - success_count, output_dir)
 
 
 def main():
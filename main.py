@@ -1,24 +1,170 @@
 from fastapi import FastAPI, Query
 from fastapi.responses import JSONResponse
 import pandas as pd
+import asyncio
 import os
+import tempfile
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from functools import lru_cache
 import numpy as np
 import rasterio
+from rasterio.enums import Resampling
 
-app = FastAPI(title="NDVI Bloom Detection API")
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:  # fall back to pandas' parser
+    pa = None
+
+@asynccontextmanager
+async def lifespan(app):
+    # One-time CSV -> Parquet conversion before serving requests
+    await asyncio.to_thread(migrate_daily_csv_to_parquet)
+    yield
+
+app = FastAPI(title="NDVI Bloom Detection API", lifespan=lifespan)
 
 DATA_DIR = r"C:\Users\user\Documents\GitHub\Nasa_Space_Apps_challenge\output"
 DAILY_CSV = os.path.join(DATA_DIR, "daily_mean_ndvi.csv")
+# Columnar copy of DAILY_CSV, written once at startup
+DAILY_PARQUET = os.path.splitext(DAILY_CSV)[0] + ".parquet"
 MOSAIC_DIR = os.path.join(DATA_DIR, "daily_mosaics")
 
 # ======= Utility =======
+# Parsed CSV plus the derived columns the endpoints serve.
+# Treat as read-only: it is shared between requests.
+DailyData = namedtuple("DailyData", ["df", "dates", "mean_ndvi", "change"])
+
+def _read_daily_csv():
+    if pa is None:
+        return pd.read_csv(DAILY_CSV, parse_dates=["date"])
+    # pyarrow's multi-threaded reader parses the dates natively
+    table = pacsv.read_csv(
+        DAILY_CSV,
+        convert_options=pacsv.ConvertOptions(
+            column_types={"date": pa.timestamp("ns"), "mean_ndvi": pa.float64()}
+        ),
+    )
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def migrate_daily_csv_to_parquet():
+    """One-time conversion of DAILY_CSV so later loads skip CSV parsing"""
+    if not os.path.exists(DAILY_CSV):
+        return
+    if (os.path.exists(DAILY_PARQUET)
+            and os.stat(DAILY_PARQUET).st_mtime_ns >= os.stat(DAILY_CSV).st_mtime_ns):
+        return  # Already up to date
+
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, suffix=".parquet.tmp")
+    except OSError:
+        return  # Read-only dir: keep using the CSV
+    os.close(fd)
+    try:
+        _read_daily_csv().to_parquet(tmp_path, compression="zstd", index=False)
+        # Atomic swap: readers never see a half-written Parquet file
+        os.replace(tmp_path, DAILY_PARQUET)
+    except Exception:
+        # No parquet engine, read-only dir or a malformed CSV: keep using
+        # the CSV so the API (and /bloom-map) still starts
+        pass
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _daily_source():
+    """Prefer the Parquet copy unless the CSV has been updated since"""
+    csv_mtime = os.stat(DAILY_CSV).st_mtime_ns if os.path.exists(DAILY_CSV) else -1
+    if os.path.exists(DAILY_PARQUET):
+        parquet_mtime = os.stat(DAILY_PARQUET).st_mtime_ns
+        if parquet_mtime >= csv_mtime:
+            return DAILY_PARQUET, parquet_mtime
+    return DAILY_CSV, os.stat(DAILY_CSV).st_mtime_ns
+
+@lru_cache(maxsize=2)
+def _load_cached(path, mtime):
+    # mtime is only the cache key; a rewritten file gets a new entry
+    if path == DAILY_PARQUET:
+        df = pd.read_parquet(path)
+    else:
+        df = _read_daily_csv()
+    df["change"] = df["mean_ndvi"].diff()
+    return DailyData(
+        df=df,
+        dates=df["date"].dt.strftime("%Y-%m-%d").tolist(),
+        mean_ndvi=df["mean_ndvi"].round(4).tolist(),
+        change=df["change"].to_numpy(),
+    )
+
 def load_daily_data():
-    df = pd.read_csv(DAILY_CSV, parse_dates=["date"])
-    return df
+    return _load_cached(*_daily_source())
+
+# Smallest overview decimation worth reading instead of full resolution
+MIN_OVERVIEW_FACTOR = 8
+
+def _sum_count(values):
+    """Float64 sum and count of valid values, without nanmean's extra passes"""
+    if np.issubdtype(values.dtype, np.integer):
+        # Integer bands can't hold NaN
+        return float(values.sum(dtype=np.float64)), values.size
+    valid = ~np.isnan(values)
+    return float(values[valid].sum(dtype=np.float64)), int(valid.sum())
+
+@lru_cache(maxsize=512)
+def _cached_mean_ndvi(tif_path, mtime):
+    # mtime is only the cache key; a rewritten mosaic gets a new entry
+    return mean_ndvi_for(tif_path)
+
+def _has_average_overviews(src):
+    """Whether band 1's overviews were built with average resampling"""
+    # gdaladdo defaults to nearest, which would just subsample the raster
+    resampling = src.tags(1).get("RESAMPLING") or src.tags().get("RESAMPLING", "")
+    return resampling.upper() == "AVERAGE"
+
+def mean_ndvi_for(tif_path):
+    """
+    Mean of band 1 without loading the full-resolution raster at once.
+
+    Mosaics with average-resampled overviews are approximated from the
+    overview: overview pixels are weighted equally even if they cover
+    partly-NaN source pixels. Otherwise the exact mean is computed block
+    by block.
+    """
+    with rasterio.open(tif_path) as src:
+        # Bands are read in their native dtype; scaled integer NDVI is
+        # converted once on the final mean rather than per pixel
+        scale = src.scales[0]
+        offset = src.offsets[0]
+
+        factors = []
+        if _has_average_overviews(src):
+            factors = [f for f in src.overviews(1) if f >= MIN_OVERVIEW_FACTOR]
+        if factors:
+            # Pre-aggregated overview: GDAL picks it for the reduced out_shape
+            factor = min(factors)
+            ndvi = src.read(
+                1,
+                out_shape=(max(1, src.height // factor), max(1, src.width // factor)),
+                resampling=Resampling.average,
+            )
+            total, count = _sum_count(ndvi)
+        else:
+            # No overview: accumulate block by block
+            total = 0.0
+            count = 0
+            for _, window in src.block_windows(1):
+                block_total, block_count = _sum_count(src.read(1, window=window))
+                total += block_total
+                count += block_count
+
+    if not count:
+        return float("nan")
+    return total / count * scale + offset
 
 # ======= Endpoint 1: Get NDVI Bloom Map =======
 @app.get("/bloom-map")
-def get_bloom_map(date: str = Query(..., description="Date in YYYY-MM-DD")):
+async def get_bloom_map(date: str = Query(..., description="Date in YYYY-MM-DD")):
     """Return NDVI map for given date"""
     date_str = pd.to_datetime(date).strftime("%Y%m%d")
     tif_path = os.path.join(MOSAIC_DIR, f"{date_str}_ndvi_mosaic.tif")
@@ -26,9 +172,10 @@ def get_bloom_map(date: str = Query(..., description="Date in YYYY-MM-DD")):
     if not os.path.exists(tif_path):
         return JSONResponse({"error": f"No NDVI mosaic found for {date}"}, status_code=404)
 
-    with rasterio.open(tif_path) as src:
-        ndvi = src.read(1)
-        mean_ndvi = float(np.nanmean(ndvi))
+    # Raster reads block, so keep them off the event loop
+    mean_ndvi = await asyncio.to_thread(
+        _cached_mean_ndvi, tif_path, os.stat(tif_path).st_mtime_ns
+    )
 
     return {
         "date": date,
@@ -38,20 +185,20 @@ def get_bloom_map(date: str = Query(..., description="Date in YYYY-MM-DD")):
 
 # ======= Endpoint 2: NDVI Trend Over Time =======
 @app.get("/bloom-trend")
-def bloom_trend(region: str = Query("California", description="Region name")):
+async def bloom_trend(region: str = Query("California", description="Region name")):
     """Return NDVI trend for the region (currently single region support)"""
-    df = load_daily_data()
+    data = await asyncio.to_thread(load_daily_data)
     return {
         "region": region,
-        "dates": df["date"].dt.strftime("%Y-%m-%d").tolist(),
-        "mean_ndvi": df["mean_ndvi"].round(4).tolist()
+        "dates": data.dates,
+        "mean_ndvi": data.mean_ndvi
     }
 
 # ======= Optional: Bloom Anomaly Detection =======
 @app.get("/bloom-anomalies")
-def detect_anomalies(threshold: float = 0.1):
-    df = load_daily_data()
-    df["change"] = df["mean_ndvi"].diff()
-    df["is_anomaly"] = (df["change"].abs() > threshold)
-    anomalies = df[df["is_anomaly"]]
+async def detect_anomalies(threshold: float = 0.1):
+    data = await asyncio.to_thread(load_daily_data)
+    mask = np.abs(data.change) > threshold
+    anomalies = data.df.iloc[mask.nonzero()[0]].copy()
+    anomalies["is_anomaly"] = True
     return anomalies.to_dict(orient="records")
@@ -1,5 +1,5 @@
+import os
 import rasterio
-import matplotlib.pyplot as plt
 
 # --- CONFIGURATION ---
 # 1. Define the path to your GeoTIFF file
@@ -21,16 +21,25 @@ try:
         print(f"Data type: {ndvi_data.dtype}")
 
         # --- VISUALIZATION ---
-        # 4. Use matplotlib to display the data, just like with the .npy file
-        plt.figure(figsize=(8, 8))
-        im = plt.imshow(ndvi_data, cmap="RdYlGn", vmin=-1, vmax=1)
+        # Only when run directly; importing this module skips matplotlib.
+        # Set HEADLESS=1 to use the non-GUI Agg backend.
+        if __name__ == "__main__":
+            import matplotlib
 
-        # 5. Add a colorbar and title for context
-        plt.colorbar(im, label="NDVI Value")
-        plt.title("GeoTIFF NDVI Visualization")
+            if os.environ.get("HEADLESS") == "1":
+                matplotlib.use("Agg")
+            import matplotlib.pyplot as plt
 
-        # 6. Show the plot
-        plt.show()
+            # 4. Use matplotlib to display the data, just like with the .npy file
+            plt.figure(figsize=(8, 8))
+            im = plt.imshow(ndvi_data, cmap="RdYlGn", vmin=-1, vmax=1)
+
+            # 5. Add a colorbar and title for context
+            plt.colorbar(im, label="NDVI Value")
+            plt.title("GeoTIFF NDVI Visualization")
+
+            # 6. Show the plot
+            plt.show()
 
 except Exception as e:
     print(f"An error occurred: {e}")